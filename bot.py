@@ -1,13 +1,89 @@
 import discord
+import logging
+import multiprocessing
 import os
 import re
 import aiohttp
 import asyncio
+import concurrent.futures
+import orjson
+import random
+import sqlite3
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 from dotenv import load_dotenv
+from common import OPENROUTER_URL, create_session, openrouter_headers, setup_logging
+from phash import compute_phash
+
+logger = logging.getLogger(__name__)
 
 # Match http(s) URLs in text; trailing punctuation is stripped when collecting (see on_message).
 URL_IN_TEXT_RE = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+')
 
+# Words that get a URL deleted on sight, matched in a single case-insensitive regex pass
+HAMSTER_KEYWORDS = ("hamster", "hamtaro", "hammy", "ebichu", "hampter")
+HAMSTER_KEYWORD_RE = re.compile("|".join(map(re.escape, HAMSTER_KEYWORDS)), re.IGNORECASE)
+
+# Custom deletion warnings for particular users, by username
+SPECIAL_WARNINGS = {
+    'andreww4444': "🚨 Good bye Andrew's Hamsters. 🚨",
+}
+
+# Discord signs CDN links with expiring query params, so the same file shows up under many URLs.
+DISCORD_CDN_HOSTS = frozenset({"cdn.discordapp.com", "media.discordapp.net"})
+DISCORD_SIGNED_URL_PARAMS = frozenset({"ex", "is", "hm"})
+
+# The only hosts the bot itself will contact for user-posted links (over https, without following
+# redirects). Everything else is left to the vision model, so chat can't point the bot at internal
+# addresses or learn its IP. Subdomains of these hosts are included.
+FETCHABLE_MEDIA_HOSTS = ("discordapp.com", "discordapp.net", "tenor.com", "giphy.com", "imgur.com")
+
+# File extensions that settle a URL's media type without probing it over the network
+IMAGE_URL_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+VIDEO_URL_EXTENSIONS = (".mp4", ".mov", ".webm")
+
+# Embed types whose thumbnail/image is the picture that was shared
+IMAGE_EMBED_TYPES = frozenset({"gifv", "image"})
+
+# How many image verdicts to remember so reposts don't go back to OpenRouter.
+VERDICT_CACHE_SIZE = 4096
+MEDIA_TYPE_CACHE_SIZE = 4096
+
+# Perceptual hashing: catches the same picture behind a different URL (reuploads, CDN rewrites).
+# Images larger than PHASH_MAX_BYTES on the wire (or too large to decode, see phash.py) skip
+# hashing and go straight to the vision model.
+PHASH_CACHE_SIZE = 4096
+PHASH_MAX_DISTANCE = 6
+PHASH_MAX_BYTES = 512 * 1024
+# Hashing a 32x32 thumbnail is cheap, so a couple of worker processes keep up with any channel
+PHASH_WORKERS = 2
+
+# Verdicts are also persisted to SQLite so a restart doesn't start from a cold cache.
+# Writes are buffered and flushed every VERDICT_FLUSH_SECONDS; rows older than 30 days are pruned weekly.
+VERDICT_DB_PATH = "verdicts.db"
+VERDICT_FLUSH_SECONDS = 10
+VERDICT_MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+VERDICT_EXPIRE_EVERY_SECONDS = 7 * 24 * 60 * 60
+
+# Vision calls allowed in flight at once across the whole bot, so a raid can't flood OpenRouter
+MAX_CONCURRENT_VISION_CALLS = 4
+
+# Images queued within this window are classified together in one multi-image request
+BATCH_WINDOW_SECONDS = 0.025
+MAX_BATCH_SIZE = 8
+
+# What counts as a hamster, shared by the single-image and batched prompts
+HAMSTER_CRITERIA = "This includes real, cartoon, anime, or highly stylized anthropomorphic characters. Look closely for specific visual cues like small, circular ears, a round body shape, or classic hamster color patches."
+
+# Client-side rate limit for OpenRouter (tune to the account's plan) and retry policy for 429/5xx
+OPENROUTER_REQUESTS_PER_SECOND = 5
+OPENROUTER_BURST = 10
+OPENROUTER_MAX_ATTEMPTS = 5
+OPENROUTER_MAX_BACKOFF_SECONDS = 30
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
 # Load the keys from your .env file
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
@@ -19,13 +95,248 @@ if not TOKEN:
 if not OPENROUTER_API_KEY:
     raise RuntimeError("OPENROUTER_API_KEY is not set or empty. Please add it to your .env file.")
 
-async def analyze_image_for_hamster(session: aiohttp.ClientSession, image_url: str) -> bool:
-    """Sends the public Discord image URL directly to OpenRouter's vision model."""
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json"
-    }
+OPENROUTER_HEADERS = openrouter_headers(OPENROUTER_API_KEY)
+
+
+def _split_url(url: str):
+    """urlsplit() that returns None for links Python refuses to parse (e.g. hosts failing NFKC checks).
+
+    Links come straight from chat, so anything parsing them has to survive whatever users type.
+    """
+    try:
+        return urlsplit(url)
+    except ValueError:
+        return None
+
+
+# The same CDN and thumbnail URLs recur constantly in busy channels, so parse each one only once
+@lru_cache(maxsize=4096)
+def canonical_url(url: str) -> str:
+    """Turns a URL into a cache key by dropping Discord's signing params and lowercasing the host.
+
+    Paths and other hosts' queries are kept as-is, since they are case-sensitive (e.g. Imgur IDs).
+    Links that can't be parsed are keyed by their raw text.
+    """
+    parts = _split_url(url)
+    if parts is None:
+        return url
+    netloc = parts.netloc.lower()
+    query = parts.query
+    if parts.hostname in DISCORD_CDN_HOSTS:
+        query = urlencode([
+            (key, value)
+            for key, value in parse_qsl(query, keep_blank_values=True)
+            if key not in DISCORD_SIGNED_URL_PARAMS
+        ])
+    return urlunsplit((parts.scheme.lower(), netloc, parts.path, query, ""))
+
+
+@lru_cache(maxsize=4096)
+def guess_media_type(url: str) -> str | None:
+    """Guesses "image" or "video" from a URL's file extension; None means it has to be probed."""
+    parts = _split_url(url)
+    if parts is None:
+        return None
+    path = parts.path.lower()
+    if path.endswith(IMAGE_URL_EXTENSIONS):
+        return "image"
+    if path.endswith(VIDEO_URL_EXTENSIONS):
+        return "video"
+    return None
+
+
+@lru_cache(maxsize=4096)
+def is_fetchable_url(url: str) -> bool:
+    """Whether the bot may request `url` directly: https on one of FETCHABLE_MEDIA_HOSTS."""
+    parts = _split_url(url)
+    if parts is None:
+        return False
+    host = (parts.hostname or "").rstrip(".")
+    return parts.scheme.lower() == "https" and any(
+        host == allowed or host.endswith("." + allowed) for allowed in FETCHABLE_MEDIA_HOSTS
+    )
+
+
+@lru_cache(maxsize=4096)
+def is_immutable_content(cache_key: str) -> bool:
+    """Whether the file behind a cache key can never change, so its verdict may be reused.
+
+    Discord attachments are immutable. Any other host can swap the file behind a URL after it has
+    been judged, so those verdicts must not outlive the lookup (perceptual hashes still catch reposts).
+    """
+    if cache_key.startswith("attachment:"):
+        return True
+    parts = _split_url(cache_key)
+    return (
+        parts is not None
+        and parts.scheme == "https"
+        and parts.hostname in DISCORD_CDN_HOSTS
+        and parts.path.startswith("/attachments/")
+    )
+
+
+def iter_image_candidates(message: discord.Message):
+    """Yields (url, cache_key, media_type) for every potential image in a message.
+
+    Candidates come from the text, attachments and embeds; media_type is None when unknown.
+    A link pasted in the text and its unfurled embed are the same image, so each cache key
+    is only yielded once.
+    """
+    seen_keys = set()
+    for candidate in _iter_all_candidates(message):
+        cache_key = candidate[1]
+        if cache_key not in seen_keys:
+            seen_keys.add(cache_key)
+            yield candidate
+
+
+def _iter_all_candidates(message: discord.Message):
+    # URLs in message text (any position)
+    if message.content:
+        for match in URL_IN_TEXT_RE.finditer(message.content):
+            url = match.group().rstrip('.,;:)\]\}')
+            yield url, canonical_url(url), guess_media_type(url)
+
+    # Attachments (keyed by ID, which stays the same however the signed URL is refreshed)
+    for attachment in message.attachments:
+        if attachment.content_type and attachment.content_type.startswith(('image/', 'video/')):
+            yield attachment.url, f"attachment:{attachment.id}", attachment.content_type.split('/', 1)[0]
+
+    # Embeds (each embed.thumbnail/embed.image access builds a new proxy, so read them once)
+    for embed in message.embeds:
+        if embed.type not in IMAGE_EMBED_TYPES:
+            continue
+        image_url = embed.thumbnail.url or embed.image.url
+        if image_url:
+            yield image_url, canonical_url(image_url), "image"
+        elif embed.url:
+            yield embed.url, canonical_url(embed.url), guess_media_type(embed.url)
+
 
+class LRUCache(OrderedDict):
+    """Bounded OrderedDict that evicts the least recently used entry once full."""
+
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def lookup(self, key):
+        """Returns the cached value (or None) and marks it as recently used."""
+        if key not in self:
+            return None
+        self.move_to_end(key)
+        return self[key]
+
+    def store(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+class PerceptualHashCache(LRUCache):
+    """LRU of perceptual hash -> verdict that also matches near-duplicate hashes."""
+
+    def __init__(self, maxsize: int, max_distance: int):
+        super().__init__(maxsize)
+        self.max_distance = max_distance
+
+    def lookup(self, phash: int):
+        """Returns the verdict for this hash, or for any cached hash within max_distance bits of it."""
+        verdict = super().lookup(phash)
+        if verdict is not None:
+            return verdict
+
+        # A linear scan of XOR popcounts is cheap at this cache size
+        for other in self:
+            if (phash ^ other).bit_count() <= self.max_distance:
+                return super().lookup(other)
+        return None
+
+
+class TokenBucket:
+    """Async token bucket: allows `rate` acquisitions per second, with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Waits until a token is available, then takes it."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# Shared by every OpenRouter call the bot makes
+openrouter_bucket = TokenBucket(OPENROUTER_REQUESTS_PER_SECOND, OPENROUTER_BURST)
+
+
+def retry_delay(attempt: int, retry_after: str | None) -> float:
+    """Seconds to wait before retrying: the server's Retry-After if given, else jittered exponential backoff."""
+    if retry_after:
+        try:
+            return min(OPENROUTER_MAX_BACKOFF_SECONDS, float(retry_after))
+        except ValueError:
+            pass # HTTP-date form; fall back to our own backoff
+    return min(OPENROUTER_MAX_BACKOFF_SECONDS, 0.5 * 2 ** attempt + random.random())
+
+
+async def post_chat_completion(session: aiohttp.ClientSession, payload: dict) -> str | None:
+    """Posts a chat completion to OpenRouter and returns the reply text, or None on failure.
+
+    Requests go through the shared token bucket, and 429/5xx responses are retried with backoff.
+    """
+    body = orjson.dumps(payload) # encoded once, reused by every retry
+    try:
+        for attempt in range(OPENROUTER_MAX_ATTEMPTS):
+            await openrouter_bucket.acquire()
+
+            # Send the request to OpenRouter with a 15-second timeout, pre-encoded with orjson
+            async with session.post(OPENROUTER_URL, headers=OPENROUTER_HEADERS, data=body, timeout=aiohttp.ClientTimeout(total=15)) as resp:
+                if resp.status in RETRYABLE_STATUSES and attempt + 1 < OPENROUTER_MAX_ATTEMPTS:
+                    delay = retry_delay(attempt, resp.headers.get("Retry-After"))
+                elif resp.status != 200:
+                    error_text = await resp.text()
+                    logger.error("Error from OpenRouter (giving up after %d attempt(s)): status=%s, body=%s", attempt + 1, resp.status, error_text)
+                    return None
+                else:
+                    data = orjson.loads(await resp.read())
+                    return data['choices'][0]['message']['content']
+
+            # Back off outside the `async with` so the connection goes back to the pool meanwhile
+            logger.warning("OpenRouter returned %s, retrying in %.1fs...", resp.status, delay)
+            await asyncio.sleep(delay)
+
+    except Exception as e:
+        logger.error("OpenRouter request failed: %s: %s", type(e).__name__, e)
+        return None
+
+
+def parse_verdict(answer: str) -> bool | None:
+    """Reads a YES/NO answer from its first letter (skipping list markers like "1." or "-"); None if it's neither."""
+    first_letter = answer.lstrip(" \t-*.)0123456789")[:1].upper()
+    if first_letter == "Y":
+        return True
+    if first_letter == "N":
+        return False
+    return None
+
+
+async def analyze_image_for_hamster(session: aiohttp.ClientSession, image_url: str) -> bool | None:
+    """Sends the public Discord image URL directly to OpenRouter's vision model.
+
+    Returns None when no verdict could be obtained, so failures are never cached.
+    """
     # 1. Prepare the payload with the URL natively
     payload = {
         "model": "openai/gpt-4o-mini",
@@ -33,66 +344,414 @@ async def analyze_image_for_hamster(session: aiohttp.ClientSession, image_url: s
             {
                 "role": "user",
                 "content": [
-                    {"type": "text", "text": "Determine if there is a hamster in this image. This includes real, cartoon, anime, or highly stylized anthropomorphic characters. Look closely for specific visual cues like small, circular ears, a round body shape, or classic hamster color patches. Answer strictly with one word: YES or NO."},
+                    {"type": "text", "text": f"Determine if there is a hamster in this image. {HAMSTER_CRITERIA} Answer strictly with one word: YES or NO."},
                     {"type": "image_url", "image_url": {"url": image_url}}
                 ]
             }
-        ]
+        ],
+        # Deterministic (so cached verdicts stay valid) and cut off right after the one word we need
+        "temperature": 0,
+        "max_tokens": 3,
+        "stop": ["\n", ".", " "]
     }
-    
-    try:
-        # 2. Send the request to OpenRouter with a 15-second timeout
-        async with session.post("https://openrouter.ai/api/v1/chat/completions", headers=headers, json=payload, timeout=aiohttp.ClientTimeout(total=15)) as resp:
-            if resp.status != 200:
-                error_text = await resp.text()
-                print(f"Error from OpenRouter: status={resp.status}, body={error_text}")
-                return False
-            
-            data = await resp.json()
-            
-            # 3. Safely parse the AI's response
-            answer = data['choices'][0]['message']['content'].strip().upper()
-            print(f"AI sees: {answer}")
-            return "YES" in answer
 
-    except Exception as e:
-        print(f"Image analysis failed: {type(e).__name__}: {e}")
-        return False
+    # 2. Send the request (rate limited and retried on 429/5xx)
+    answer = await post_chat_completion(session, payload)
+    if answer is None:
+        return None
+
+    # 3. Parse the AI's response; only the first letter matters
+    logger.info("AI sees: %s", answer.strip())
+    return parse_verdict(answer)
+
+
+async def analyze_images_for_hamster(session: aiohttp.ClientSession, image_urls: list[str]) -> list[bool] | None:
+    """Asks the vision model about several images in one request, expecting one YES/NO line per image.
+
+    Returns None if the request fails or the answer can't be matched up with the images.
+    """
+    content = [{"type": "text", "text": f"You will be shown {len(image_urls)} images. For each image, determine if there is a hamster in it. {HAMSTER_CRITERIA} For each image, answer YES or NO on its own line, in the same order as the images, and nothing else."}]
+    content.extend({"type": "image_url", "image_url": {"url": url}} for url in image_urls)
+    payload = {
+        "model": "openai/gpt-4o-mini",
+        "messages": [{"role": "user", "content": content}],
+        "temperature": 0,
+        "max_tokens": 4 * len(image_urls) # a YES/NO and a newline per image
+    }
+
+    answer = await post_chat_completion(session, payload)
+    if answer is None:
+        return None
+
+    verdicts = [parse_verdict(line) for line in answer.splitlines() if line.strip()]
+    logger.info("AI sees: %s", verdicts)
+    if len(verdicts) != len(image_urls) or None in verdicts:
+        logger.warning("Malformed batch answer for %d images: %r", len(image_urls), answer)
+        return None
+    return verdicts
+
+
+class BatchScheduler:
+    """Debounces image lookups so images arriving close together share one OpenRouter request."""
+
+    def __init__(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                 window: float = BATCH_WINDOW_SECONDS, max_batch: int = MAX_BATCH_SIZE):
+        self.session = session
+        self.semaphore = semaphore # bounds how many requests are in flight at once
+        self.window = window
+        self.max_batch = max_batch
+        self.pending: list[tuple[str, asyncio.Future]] = []
+        self.flush_handle: asyncio.TimerHandle | None = None
+        self.batch_tasks: set[asyncio.Task] = set() # keeps running batches from being garbage collected
+
+    async def enqueue(self, image_url: str) -> bool | None:
+        """Queues an image for the next batch and waits for its verdict (None if it failed)."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((image_url, future))
+
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.window, self.flush)
+        return await future
+
+    def flush(self):
+        """Sends everything queued so far as one batch."""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.create_task(self._run_batch(batch))
+            self.batch_tasks.add(task)
+            task.add_done_callback(self.batch_tasks.discard)
+
+    async def _classify_one(self, image_url: str) -> bool | None:
+        async with self.semaphore:
+            return await analyze_image_for_hamster(self.session, image_url)
+
+    async def _run_batch(self, batch: list[tuple[str, asyncio.Future]]):
+        image_urls = [url for url, _ in batch]
+        try:
+            if len(image_urls) == 1:
+                verdicts = [await self._classify_one(image_urls[0])]
+            else:
+                async with self.semaphore:
+                    verdicts = await analyze_images_for_hamster(self.session, image_urls)
+                if verdicts is None:
+                    # Fall back to asking about each image on its own
+                    verdicts = await asyncio.gather(*(self._classify_one(url) for url in image_urls))
+
+            for (_, future), verdict in zip(batch, verdicts):
+                if not future.done():
+                    future.set_result(verdict)
+        finally:
+            # Never leave a caller hanging, even if the batch blew up
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+
+class VerdictStore:
+    """SQLite-backed verdict cache that survives restarts, with buffered batch writes.
+
+    The connection lives on a single worker thread so queries never block the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.connection = None
+        self.pending: dict[str, bool] = {} # written on the next flush()
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def _open(self):
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, verdict INTEGER, ts INTEGER)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS verdicts_ts ON verdicts (ts)")
+        self.connection.commit()
+
+    async def open(self):
+        await self._run(self._open)
+
+    def _lookup(self, key: str):
+        if self.connection is None: # closed while this lookup was queued
+            return None
+        row = self.connection.execute("SELECT verdict FROM verdicts WHERE key = ?", (key,)).fetchone()
+        return None if row is None else bool(row[0])
+
+    async def lookup(self, key: str) -> bool | None:
+        """Returns the stored verdict for `key`, or None if there isn't one."""
+        if key in self.pending:
+            return self.pending[key]
+        if self.connection is None: # closed (the bot is shutting down)
+            return None
+        try:
+            return await self._run(self._lookup, key)
+        except sqlite3.Error as e:
+            logger.error("Verdict lookup failed: %s: %s", type(e).__name__, e)
+            return None
+
+    def _recent_with_prefix(self, prefix: str, limit: int):
+        return self.connection.execute(
+            "SELECT key, verdict FROM verdicts WHERE key >= ? AND key < ? ORDER BY ts DESC LIMIT ?",
+            (prefix, prefix + "\uffff", limit),
+        ).fetchall()
+
+    async def recent_with_prefix(self, prefix: str, limit: int) -> list[tuple[str, bool]]:
+        """Returns up to `limit` of the newest (key, verdict) rows whose key starts with `prefix`."""
+        rows = await self._run(self._recent_with_prefix, prefix, limit)
+        return [(key, bool(verdict)) for key, verdict in rows]
+
+    def store(self, key: str, verdict: bool):
+        """Buffers a verdict; it reaches the database on the next flush()."""
+        self.pending[key] = verdict
+
+    def _write(self, rows):
+        self.connection.executemany("INSERT OR REPLACE INTO verdicts (key, verdict, ts) VALUES (?, ?, ?)", rows)
+        self.connection.commit()
+
+    async def flush(self):
+        """Writes all buffered verdicts in one transaction."""
+        if not self.pending:
+            return
+        now = int(time.time())
+        rows = [(key, int(verdict), now) for key, verdict in self.pending.items()]
+        self.pending = {}
+        try:
+            await self._run(self._write, rows)
+        except sqlite3.Error as e:
+            logger.error("Saving %d verdicts failed: %s: %s", len(rows), type(e).__name__, e)
+
+    def _expire(self, cutoff: int) -> int:
+        deleted = self.connection.execute("DELETE FROM verdicts WHERE ts < ?", (cutoff,)).rowcount
+        self.connection.commit()
+        return deleted
+
+    async def expire(self, max_age: int):
+        """Deletes verdicts older than `max_age` seconds."""
+        try:
+            deleted = await self._run(self._expire, int(time.time()) - max_age)
+            logger.info("Pruned %d expired verdicts.", deleted)
+        except sqlite3.Error as e:
+            logger.error("Pruning verdicts failed: %s: %s", type(e).__name__, e)
+
+    async def close(self):
+        await self.flush()
+        if self.connection is not None:
+            # Detach first so lookups arriving from now on answer None instead of touching the executor
+            connection, self.connection = self.connection, None
+            await self._run(connection.close)
+        # Everything submitted has finished by now, and waiting here would block the event loop
+        self.executor.shutdown(wait=False)
 
 
 class HamsterBot(discord.Client):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.session = None # Placeholder for our web session
-        self.forbidden_words = ["hamster", "hamtaro", "hammy", "ebichu", "hampter"]
+        self.scheduler = None # Batches vision calls; created alongside the session
+        self.executor = None # Process pool for CPU-bound image hashing
+        self.verdict_store = VerdictStore(VERDICT_DB_PATH) # verdicts that outlive restarts
+        self.persist_task = None # Background flush/prune loop for verdict_store
+        self.verdict_cache = LRUCache(VERDICT_CACHE_SIZE) # cache key -> YES/NO verdict
+        self.inflight: dict[str, asyncio.Future] = {} # cache key -> vision call in progress
+        self.media_type_cache = LRUCache(MEDIA_TYPE_CACHE_SIZE) # cache key -> probed media type
+        self.phash_cache = PerceptualHashCache(PHASH_CACHE_SIZE, PHASH_MAX_DISTANCE) # image hash -> verdict
+        self.vision_semaphore = asyncio.Semaphore(MAX_CONCURRENT_VISION_CALLS) # shared by all messages
 
     async def setup_hook(self):
         # Initialize the session once when the bot starts
-        self.session = aiohttp.ClientSession()
+        self.session = create_session()
+        self.scheduler = BatchScheduler(self.session, self.vision_semaphore)
+        # Image decoding + DCT would hold the GIL and stall the gateway heartbeat, so spread it over processes.
+        # Forking is unsafe once the logging, sqlite and resolver threads are running, so use a forkserver
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=PHASH_WORKERS, mp_context=multiprocessing.get_context("forkserver")
+        )
+
+        # Open the persistent verdicts and warm the perceptual hash index with the newest ones
+        await self.verdict_store.open()
+        for key, is_hamster in reversed(await self.verdict_store.recent_with_prefix("phash:", PHASH_CACHE_SIZE)):
+            self.phash_cache.store(int(key.removeprefix("phash:"), 16), is_hamster)
+        self.persist_task = asyncio.create_task(self._persist_verdicts())
 
     async def close(self):
-        # Clean up the session safely when the bot shuts down
+        # Clean up the session safely when the bot shuts down, saving any unwritten verdicts
+        if self.persist_task:
+            self.persist_task.cancel()
+            # Let an in-progress flush or expiry finish before the store closes underneath it
+            await asyncio.gather(self.persist_task, return_exceptions=True)
+        await self.verdict_store.close()
         if self.session:
             await self.session.close()
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
         await super().close()
 
+    async def _persist_verdicts(self):
+        """Flushes buffered verdicts to disk every few seconds and prunes old ones weekly."""
+        last_expiry = None
+        while True:
+            if last_expiry is None or time.monotonic() - last_expiry >= VERDICT_EXPIRE_EVERY_SECONDS:
+                await self.verdict_store.expire(VERDICT_MAX_AGE_SECONDS)
+                last_expiry = time.monotonic()
+            await asyncio.sleep(VERDICT_FLUSH_SECONDS)
+            await self.verdict_store.flush()
+
     async def on_ready(self):
-        print(f'Logged in as {self.user} - Ready to terminate hamsters.')
+        logger.info('Logged in as %s - Ready to terminate hamsters.', self.user)
+
+    async def probe_media_type(self, url: str, cache_key: str) -> str | None:
+        """HEAD-probes a URL for its Content-Type, which is far cheaper than a wasted vision call.
+
+        Returns the top-level type (e.g. "image", "video", "text"), or None if the probe failed
+        or the URL isn't one the bot may contact itself.
+        """
+        if not is_fetchable_url(url):
+            return None
+
+        media_type = self.media_type_cache.lookup(cache_key)
+        if media_type is not None:
+            return media_type
+
+        try:
+            async with self.session.head(url, allow_redirects=False, timeout=aiohttp.ClientTimeout(total=2)) as resp:
+                if resp.status != 200:
+                    return None
+                content_type = resp.headers.get("Content-Type", "")
+        # ValueError covers URLs aiohttp can't even encode (e.g. a bad IDNA host); treat them as unknown
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.warning("Media type probe failed for %s: %s: %s", url, type(e).__name__, e)
+            return None
+
+        media_type = content_type.split('/', 1)[0].strip().lower() or None
+        if media_type:
+            self.media_type_cache.store(cache_key, media_type)
+        return media_type
+
+    async def fetch_image_bytes(self, url: str) -> bytes | None:
+        """Downloads an image for hashing, giving up on anything larger than PHASH_MAX_BYTES.
+
+        Only allowlisted CDN URLs are downloaded (see is_fetchable_url); others return None.
+        """
+        if not is_fetchable_url(url):
+            return None
+
+        try:
+            async with self.session.get(url, allow_redirects=False, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+                if resp.status != 200 or (resp.content_length or 0) > PHASH_MAX_BYTES:
+                    return None
+
+                chunks = []
+                size = 0
+                async for chunk in resp.content.iter_chunked(64 * 1024):
+                    size += len(chunk)
+                    if size > PHASH_MAX_BYTES:
+                        return None
+                    chunks.append(chunk)
+                return b"".join(chunks)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.warning("Image download failed for %s: %s: %s", url, type(e).__name__, e)
+            return None
+
+    async def image_phash(self, url: str) -> int | None:
+        """Returns the perceptual hash of the image at `url`, or None if it couldn't be fetched or decoded."""
+        image_bytes = await self.fetch_image_bytes(url)
+        if image_bytes is None:
+            return None
+        try:
+            # Only the raw bytes cross the process boundary
+            return await asyncio.get_running_loop().run_in_executor(self.executor, compute_phash, image_bytes)
+        except Exception as e: # Pillow raises a variety of errors for truncated or odd files
+            logger.warning("Image hashing failed for %s: %s: %s", url, type(e).__name__, e)
+            return None
+
+    async def check_image(self, url: str, cache_key: str) -> bool:
+        """Returns the vision verdict for an image, reusing a cached one for repeat content."""
+        cached = self.verdict_cache.lookup(cache_key)
+        if cached is not None:
+            logger.info("Cache hit for %s: %s", cache_key, 'YES' if cached else 'NO')
+            return cached
+
+        # Piggyback on an identical lookup that is already waiting on OpenRouter
+        pending = self.inflight.get(cache_key)
+        if pending is None:
+            pending = asyncio.create_task(self._fetch_verdict(url, cache_key))
+            self.inflight[cache_key] = pending
+
+        # Shielded so one caller giving up doesn't cancel the lookup others are sharing
+        return await asyncio.shield(pending)
+
+    async def _fetch_verdict(self, url: str, cache_key: str) -> bool:
+        """Runs the actual vision call for a cache miss and records the verdict."""
+        try:
+            # Seen before the last restart? (Only immutable content is ever stored by key.)
+            if is_immutable_content(cache_key):
+                is_hamster = await self.verdict_store.lookup(cache_key)
+                if is_hamster is not None:
+                    logger.info("Stored verdict for %s: %s", cache_key, 'YES' if is_hamster else 'NO')
+                    self.verdict_cache.store(cache_key, is_hamster)
+                    return is_hamster
+
+            # Same picture seen before under another URL? Reuse that verdict.
+            phash = await self.image_phash(url)
+            if phash is not None:
+                is_hamster = self.phash_cache.lookup(phash)
+                if is_hamster is not None:
+                    logger.info("Perceptual hash match for %s: %s", cache_key, 'YES' if is_hamster else 'NO')
+                    self._remember(cache_key, None, is_hamster)
+                    return is_hamster
+
+            is_hamster = await self.scheduler.enqueue(url)
+            if is_hamster is not None:
+                self._remember(cache_key, phash, is_hamster)
+            return bool(is_hamster)
+        finally:
+            del self.inflight[cache_key]
+
+    def _remember(self, cache_key: str, phash: int | None, is_hamster: bool):
+        """Records a verdict in the in-memory caches and queues it for the persistent store.
+
+        Verdicts for mutable URLs are only remembered by perceptual hash, which follows the pixels.
+        """
+        if is_immutable_content(cache_key):
+            self.verdict_cache.store(cache_key, is_hamster)
+            self.verdict_store.store(cache_key, is_hamster)
+        if phash is not None:
+            self.phash_cache.store(phash, is_hamster)
+            self.verdict_store.store(f"phash:{phash:016x}", is_hamster)
+
+    async def _scan_candidate(self, message, url: str, cache_key: str, media_type: str | None) -> bool:
+        """Checks a single keyword-clean candidate URL with the vision model."""
+        # Only images can be judged, so drop videos and web pages before paying for a call.
+        # If the type can't be determined we still let the vision model have a look.
+        if media_type is None:
+            media_type = await self.probe_media_type(url, cache_key)
+        if media_type not in (None, "image"):
+            logger.info("Skipping non-image URL (%s): %s", media_type, url)
+            return False
+
+        logger.info("URL seems clean, scanning image pixels from %s...", message.author)
+        return await self.check_image(url, cache_key)
 
     async def _delete_and_warn(self, message):
         """Helper method to handle deletions safely and keep code DRY."""
         try:
             warning_text = (
-                "🚨 Good bye Andrew's Hamsters. 🚨" 
-                if message.author.name == 'andreww4444' 
-                else f"🚨 {message.author.mention}, hamster detected and deleted! 🚨"
+                SPECIAL_WARNINGS.get(message.author.name)
+                or f"🚨 {message.author.mention}, hamster detected and deleted! 🚨"
             )
             await message.delete()
             await message.channel.send(warning_text)
         except discord.Forbidden:
-            print("Error: Bot doesn't have permission to delete messages in this channel.")
+            logger.error("Bot doesn't have permission to delete messages in this channel.")
         except discord.NotFound:
-            print("Warning: message could not be deleted (not found or already deleted).")
+            logger.warning("Message could not be deleted (not found or already deleted).")
 
     async def on_message_edit(self, before, after):
         """Catches delayed embeds (like pasted Tenor/Giphy links) that unfurl after sending."""
@@ -100,56 +759,59 @@ class HamsterBot(discord.Client):
             await self.on_message(after)
 
     async def on_message(self, message):
-        # Ignore messages from the bot itself
-        if message.author == self.user:
+        # Ignore messages from bots (including this one)
+        if message.author.bot:
+            return
+
+        # Plain text with no links, attachments or embeds can't carry an image
+        if not message.attachments and not message.embeds and 'http' not in message.content:
             return
 
-        # 1. Collect ALL potential image URLs (from text, attachments, embeds) to scan
-        urls_to_check = []
-
-        # URLs in message text (any position)
-        if message.content:
-            for url in URL_IN_TEXT_RE.findall(message.content):
-                urls_to_check.append(url.rstrip('.,;:)\]\}'))
-
-        # Attachments
-        for attachment in message.attachments:
-            if attachment.content_type and attachment.content_type.startswith(('image/', 'video/')):
-                urls_to_check.append(attachment.url)
-
-        # Embeds
-        for embed in message.embeds:
-            if embed.type in ['gifv', 'image']:
-                url = embed.thumbnail.url if embed.thumbnail else embed.url
-                if url:
-                    urls_to_check.append(url)
-
-        # 2. Process the collected URLs
-        for url in urls_to_check:
-            url_lower = url.lower()
-            
-            # Fast-Path: Check the URL string itself
-            if any(word in url_lower for word in self.forbidden_words):
-                print(f"URL string triggered deletion: {url}")
+        # 1. Fast-Path: stream every potential image URL (text, attachments, embeds) through the
+        #    keyword check first, so a hit anywhere deletes without paying for a single vision call
+        clean_candidates = []
+        for url, cache_key, media_type in iter_image_candidates(message):
+            if HAMSTER_KEYWORD_RE.search(url):
+                logger.info("URL string triggered deletion: %s", url)
                 await self._delete_and_warn(message)
                 return # Stop looping, message is already gone
-                
-            # Slow-Path: Send to the Vision AI
-            print(f"URL seems clean, scanning image pixels from {message.author}...")
-            is_hamster = await analyze_image_for_hamster(self.session, url)
+            clean_candidates.append((url, cache_key, media_type))
 
-            # 3. Execute the deletion if AI detects a hamster
-            if is_hamster:
-                await self._delete_and_warn(message)
-                return # Stop looping through remaining images, message is gone
+        # 2. Slow-Path: Send the remaining URLs to the Vision AI all at once, so a multi-image
+        #    post takes as long as its slowest image rather than the sum of them
+        tasks = [
+            asyncio.create_task(self._scan_candidate(message, url, cache_key, media_type))
+            for url, cache_key, media_type in clean_candidates
+        ]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                # One broken candidate shouldn't keep the others from being judged
+                try:
+                    is_hamster = await next_result
+                except Exception as e:
+                    logger.error("Scanning a candidate failed: %s: %s", type(e).__name__, e)
+                    continue
+
+                # 3. Execute the deletion as soon as any image comes back as a hamster
+                if is_hamster:
+                    await self._delete_and_warn(message)
+                    return # Message is gone, no need to wait on the remaining images
+        finally:
+            for task in tasks:
+                task.cancel()
 
 
 # Set up Discord intents
 intents = discord.Intents.default()
 intents.message_content = True
 
-# Initialize and run the bot
-client = HamsterBot(intents=intents)
-
 if __name__ == "__main__":
-    client.run(TOKEN)
\ No newline at end of file
+    # Initialize and run the bot. Hashing workers re-import this file as __mp_main__, so the
+    # client (and its verdict store) is only built here.
+    client = HamsterBot(intents=intents)
+    log_listener = setup_logging()
+    try:
+        # log_handler=None keeps discord.py from installing its own handler, so its logs use our queue too
+        client.run(TOKEN, log_handler=None)
+    finally:
+        log_listener.stop()
\ No newline at end of file
@@ -0,0 +1,39 @@
+"""Setup shared by bot.py and grok_bot.py."""
+import aiohttp
+import logging
+import logging.handlers
+import queue
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+
+def openrouter_headers(api_key: str) -> dict[str, str]:
+    """Request headers for OpenRouter; callers build them once and reuse them for every request."""
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+
+def create_session() -> aiohttp.ClientSession:
+    """Creates a bot's long-lived HTTP session (call it from setup_hook, inside the event loop).
+
+    The pooled keep-alive connections and cached DNS let every OpenRouter call skip the TCP + TLS handshake.
+    """
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(
+        limit=32, limit_per_host=16, ttl_dns_cache=300, keepalive_timeout=75
+    ))
+
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """Routes all logging through a queue so formatting and stderr writes happen off the event loop."""
+    log_queue = queue.SimpleQueue()
+    # The queue side only merges the message args; timestamps and layout are added by the listener
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
@@ -1,8 +1,13 @@
 import discord
+import logging
 import os
 import aiohttp
 import asyncio
+import orjson
 from dotenv import load_dotenv
+from common import OPENROUTER_URL, create_session, openrouter_headers, setup_logging
+
+logger = logging.getLogger(__name__)
 
 # Load the keys from your .env file
 load_dotenv()
@@ -12,15 +17,25 @@ OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 if not TOKEN or not OPENROUTER_API_KEY:
     raise RuntimeError("Missing DISCORD_TOKEN or OPENROUTER_API_KEY in .env file.")
 
+OPENROUTER_HEADERS = openrouter_headers(OPENROUTER_API_KEY)
+
+# Request body for a system + user chat completion; the two %s slots take JSON-encoded strings
+PAYLOAD_TEMPLATE = b'{"model":"openai/gpt-4o-mini","messages":[{"role":"system","content":%s},{"role":"user","content":%s}]}'
+
+# OpenRouter requests allowed in flight at once, so a burst of tags queues up instead of hitting rate limits
+MAX_CONCURRENT_REQUESTS = 8
+
 class GrokSummarizer(discord.Client):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.session = None # Placeholder for our aiohttp web session
-        self.grok_role_id = "1467201281746796729" # Stored for easy access
+        self.grok_role_id = 1467201281746796729 # Stored for easy access
+        self.grok_mention = f"<@&{self.grok_role_id}>" # How the role tag appears in message text
+        self.openrouter_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
 
     async def setup_hook(self):
         # Initialize the session once when the bot starts
-        self.session = aiohttp.ClientSession()
+        self.session = create_session()
 
     async def close(self):
         # Clean up the session safely when the bot shuts down
@@ -29,15 +44,10 @@ class GrokSummarizer(discord.Client):
         await super().close()
 
     async def on_ready(self):
-        print(f'✅ Logged in as {self.user} - Ready to assist with Grok!')
+        logger.info('✅ Logged in as %s - Ready to assist with Grok!', self.user)
 
     async def fetch_grok_response(self, chat_log: str, user_prompt: str = None) -> str:
         """Sends the compiled chat history and optional user prompt to OpenRouter."""
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
         # Determine the system and user instructions based on the presence of a user_prompt
         if user_prompt:
             system_instruction = "Accurately answer the user's prompt in 1-3 sentences, concisely."
@@ -46,35 +56,25 @@ class GrokSummarizer(discord.Client):
             system_instruction = "Read the following chat history and provide a concise, readable summary of the conversation. Focus on the main topics and any conclusions reached in 3 sentences max."
             user_content = f"Here is the recent chat history:\n\n{chat_log}"
 
-        payload = {
-            "model": "openai/gpt-4o-mini", 
-            "messages": [
-                {
-                    "role": "system", 
-                    "content": system_instruction
-                },
-                {
-                    "role": "user", 
-                    "content": user_content
-                }
-            ]
-        }
+        # Only the two message strings vary, so JSON-encode just those into the fixed request skeleton
+        body = PAYLOAD_TEMPLATE % (orjson.dumps(system_instruction), orjson.dumps(user_content))
 
         try:
-            # Send the request to OpenRouter with a 15-second timeout
-            async with self.session.post("https://openrouter.ai/api/v1/chat/completions", headers=headers, json=payload, timeout=aiohttp.ClientTimeout(total=15)) as resp:
-                if resp.status != 200:
-                    error_text = await resp.text()
-                    print(f"Error from OpenRouter: status={resp.status}, body={error_text}")
-                    return "⚠️ Sorry, I ran into an API error while trying to process that."
+            async with self.openrouter_semaphore:
+                # Send the request to OpenRouter with a 15-second timeout
+                async with self.session.post(OPENROUTER_URL, headers=OPENROUTER_HEADERS, data=body, timeout=aiohttp.ClientTimeout(total=15)) as resp:
+                    if resp.status != 200:
+                        error_text = await resp.text()
+                        logger.error("Error from OpenRouter: status=%s, body=%s", resp.status, error_text)
+                        return "⚠️ Sorry, I ran into an API error while trying to process that."
                 
-                data = await resp.json()
-                return data['choices'][0]['message']['content'].strip()
+                    data = orjson.loads(await resp.read())
+                    return data['choices'][0]['message']['content'].strip()
 
         except asyncio.TimeoutError:
             return "⚠️ Grok took too long to respond. Please try again later."
         except Exception as e:
-            print(f"Unexpected error: {e}")
+            logger.exception("Unexpected error: %s", e)
             return "⚠️ An unexpected error occurred while contacting Grok."
 
     async def on_message(self, message):
@@ -83,11 +83,11 @@ class GrokSummarizer(discord.Client):
             return
         
         # Check if the specific role was mentioned
-        grok_role_mentioned = any(role.id == int(self.grok_role_id) for role in message.role_mentions)
+        grok_role_mentioned = any(role.id == self.grok_role_id for role in message.role_mentions)
         
         if grok_role_mentioned:
             # Extract any text sent alongside the tag
-            clean_prompt = message.content.replace(f"<@&{self.grok_role_id}>", "").strip()
+            clean_prompt = message.content.replace(self.grok_mention, "").strip()
             
             # Send an appropriate loading message
             if not clean_prompt:
@@ -96,20 +96,21 @@ class GrokSummarizer(discord.Client):
                 loading_msg = await message.channel.send("Thinking... ⏳")
 
             try:
-                # 1. Fetch the last 31 messages (30 history + the trigger message itself)
-                messages = [msg async for msg in message.channel.history(limit=31)]
-                messages.reverse() # Reverse so they read chronologically (oldest to newest)
-
-                # 2. Format the chat history into a string
-                chat_log = ""
-                # Use [:-1] to exclude the command message that just triggered the bot
-                for msg in messages[:-1]: 
+                # 1. Stream the 30 messages before the trigger (newest first); `before` leaves out
+                #    both the command message and our own loading message
+                lines = []
+                async for msg in message.channel.history(limit=30, before=message):
+                    content = msg.content.strip()
                     # Skip empty messages (like images with no text) to save tokens
-                    if msg.content.strip():
-                        chat_log += f"[{msg.author.display_name}]: {msg.content}\n"
+                    if content:
+                        lines.append(f"[{msg.author.display_name}]: {content}")
+
+                # 2. Format the chat history into a string, oldest to newest
+                lines.reverse()
+                chat_log = "\n".join(lines)
 
                 # 3. Check if there's actually anything to read
-                if not chat_log.strip():
+                if not chat_log:
                     await loading_msg.edit(content="There is no recent text history here.")
                     return
 
@@ -125,9 +126,10 @@ class GrokSummarizer(discord.Client):
             except discord.Forbidden:
                 await loading_msg.edit(content="⚠️ I don't have permission to read message history in this channel.")
             except Exception as e:
-                print(f"Error fetching history: {e}")
+                logger.exception("Error fetching history: %s", e)
                 await loading_msg.edit(content="⚠️ Something went wrong while reading the channel history.")
 
+
 # Set up Discord intents
 intents = discord.Intents.default()
 intents.message_content = True # Required to read what users say!
@@ -136,4 +138,9 @@ intents.message_content = True # Required to read what users say!
 client = GrokSummarizer(intents=intents)
 
 if __name__ == "__main__":
-    client.run(TOKEN)
\ No newline at end of file
+    log_listener = setup_logging()
+    try:
+        # log_handler=None keeps discord.py from installing its own handler, so its logs use our queue too
+        client.run(TOKEN, log_handler=None)
+    finally:
+        log_listener.stop()
\ No newline at end of file
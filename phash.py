@@ -0,0 +1,49 @@
+"""Perceptual image hashing for bot.py's worker processes; no import-time side effects."""
+import io
+import math
+import statistics
+
+# Images above PHASH_MAX_PIXELS once decoded aren't hashed (a tiny PNG can still decode to
+# hundreds of megabytes)
+PHASH_MAX_PIXELS = 2048 * 2048
+PHASH_IMAGE_SIZE = 32
+PHASH_LOW_FREQUENCIES = 8
+
+# Cosine basis for the lowest DCT frequencies of a PHASH_IMAGE_SIZE-wide signal
+_PHASH_DCT_BASIS = [
+    [math.cos(math.pi * (2 * x + 1) * u / (2 * PHASH_IMAGE_SIZE)) for x in range(PHASH_IMAGE_SIZE)]
+    for u in range(PHASH_LOW_FREQUENCIES)
+]
+
+
+def compute_phash(image_bytes: bytes) -> int | None:
+    """Computes a 64-bit perceptual hash: DCT of a 32x32 grayscale thumbnail, low 8x8 vs. their median.
+
+    Returns None for images too large to decode cheaply.
+    """
+    # Imported here so only the hashing worker processes pay for loading Pillow
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        # Opening only reads the header; let JPEGs decode at reduced scale, then refuse anything still huge
+        image.draft("L", (PHASH_IMAGE_SIZE, PHASH_IMAGE_SIZE))
+        width, height = image.size
+        if width * height > PHASH_MAX_PIXELS:
+            return None
+        thumbnail = image.convert("L").resize((PHASH_IMAGE_SIZE, PHASH_IMAGE_SIZE), Image.Resampling.LANCZOS)
+        pixels = list(thumbnail.tobytes()) # one byte per pixel in "L" mode
+
+    # Separable 2D DCT, only computing the low frequencies we keep
+    rows = [pixels[y * PHASH_IMAGE_SIZE:(y + 1) * PHASH_IMAGE_SIZE] for y in range(PHASH_IMAGE_SIZE)]
+    row_freqs = [[sum(b * p for b, p in zip(basis, row)) for basis in _PHASH_DCT_BASIS] for row in rows]
+    coefficients = [
+        sum(basis[y] * row_freqs[y][v] for y in range(PHASH_IMAGE_SIZE))
+        for basis in _PHASH_DCT_BASIS
+        for v in range(PHASH_LOW_FREQUENCIES)
+    ]
+
+    median = statistics.median(coefficients)
+    phash = 0
+    for coefficient in coefficients:
+        phash = (phash << 1) | (coefficient > median)
+    return phash
@@ -0,0 +1,5 @@
+import os
+
+# bot.py refuses to import without its secrets; the tests never talk to Discord or OpenRouter
+os.environ.setdefault("DISCORD_TOKEN", "test-token")
+os.environ.setdefault("OPENROUTER_API_KEY", "test-key")
@@ -0,0 +1,91 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from bot import BatchScheduler, analyze_images_for_hamster
+
+URLS = [f"https://cdn.discordapp.com/attachments/1/2/{i}.png" for i in range(3)]
+
+
+class KeepFinishedTasks(set):
+    """batch_tasks that keeps finished tasks around, so a test can retrieve their exceptions."""
+
+    def discard(self, task):
+        pass
+
+
+class BatchSchedulerTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.single = mock.patch("bot.analyze_image_for_hamster", new_callable=mock.AsyncMock).start()
+        self.batched = mock.patch("bot.analyze_images_for_hamster", new_callable=mock.AsyncMock).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def make_scheduler(self, window=0.01, max_batch=8):
+        return BatchScheduler(mock.sentinel.session, asyncio.Semaphore(4), window=window, max_batch=max_batch)
+
+    async def test_lone_image_uses_single_image_request(self):
+        self.single.return_value = True
+        self.assertTrue(await self.make_scheduler().enqueue(URLS[0]))
+        self.single.assert_awaited_once_with(mock.sentinel.session, URLS[0])
+        self.batched.assert_not_awaited()
+
+    async def test_images_within_window_share_one_request(self):
+        self.batched.return_value = [True, False, True]
+        scheduler = self.make_scheduler()
+        verdicts = await asyncio.gather(*(scheduler.enqueue(url) for url in URLS))
+        self.assertEqual(verdicts, [True, False, True])
+        self.batched.assert_awaited_once_with(mock.sentinel.session, URLS)
+        self.single.assert_not_awaited()
+
+    async def test_full_batch_is_sent_without_waiting_for_window(self):
+        self.batched.return_value = [False, False]
+        scheduler = self.make_scheduler(window=60, max_batch=2)
+        verdicts = await asyncio.wait_for(asyncio.gather(*(scheduler.enqueue(url) for url in URLS[:2])), timeout=1)
+        self.assertEqual(verdicts, [False, False])
+
+    async def test_failed_batch_falls_back_to_one_request_per_image(self):
+        self.batched.return_value = None
+        self.single.side_effect = lambda session, url: url == URLS[1]
+        scheduler = self.make_scheduler()
+        verdicts = await asyncio.gather(*(scheduler.enqueue(url) for url in URLS))
+        self.assertEqual(verdicts, [False, True, False])
+        self.assertEqual(sorted(call.args[1] for call in self.single.await_args_list), URLS)
+
+    async def test_failed_fallback_reports_unknown(self):
+        self.batched.return_value = None
+        self.single.return_value = None
+        scheduler = self.make_scheduler()
+        self.assertEqual(await asyncio.gather(*(scheduler.enqueue(url) for url in URLS[:2])), [None, None])
+
+    async def test_callers_are_released_if_the_batch_raises(self):
+        self.batched.side_effect = RuntimeError("boom")
+        scheduler = self.make_scheduler()
+        scheduler.batch_tasks = KeepFinishedTasks()
+        verdicts = await asyncio.wait_for(asyncio.gather(*(scheduler.enqueue(url) for url in URLS[:2])), timeout=1)
+        self.assertEqual(verdicts, [None, None])
+        # Retrieve the batch task's exception so it isn't reported as unhandled
+        await asyncio.gather(*scheduler.batch_tasks, return_exceptions=True)
+
+
+class AnalyzeImagesForHamsterTests(unittest.IsolatedAsyncioTestCase):
+    async def ask(self, answer):
+        with mock.patch("bot.post_chat_completion", new_callable=mock.AsyncMock, return_value=answer):
+            return await analyze_images_for_hamster(mock.sentinel.session, URLS)
+
+    async def test_one_line_per_image(self):
+        self.assertEqual(await self.ask("1. YES\n2. no\n\n3. Yes"), [True, False, True])
+
+    async def test_wrong_line_count_is_rejected(self):
+        with self.assertLogs("bot", "WARNING"):
+            self.assertIsNone(await self.ask("YES\nNO"))
+
+    async def test_unreadable_line_is_rejected(self):
+        with self.assertLogs("bot", "WARNING"):
+            self.assertIsNone(await self.ask("YES\nMAYBE\nNO"))
+
+    async def test_failed_request_is_unknown(self):
+        self.assertIsNone(await self.ask(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
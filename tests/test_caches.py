@@ -0,0 +1,56 @@
+import unittest
+
+from bot import LRUCache, PerceptualHashCache
+
+
+class LRUCacheTests(unittest.TestCase):
+    def test_missing_key_is_none(self):
+        self.assertIsNone(LRUCache(2).lookup("a"))
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.store("a", True)
+        cache.store("b", False)
+        cache.lookup("a") # a is now the most recent
+        cache.store("c", True)
+        self.assertEqual(list(cache), ["a", "c"])
+
+    def test_restoring_a_key_refreshes_it(self):
+        cache = LRUCache(2)
+        cache.store("a", True)
+        cache.store("b", True)
+        cache.store("a", False)
+        cache.store("c", True)
+        self.assertEqual(dict(cache), {"a": False, "c": True})
+
+    def test_false_verdicts_are_cached(self):
+        cache = LRUCache(1)
+        cache.store("a", False)
+        self.assertIs(cache.lookup("a"), False)
+
+
+class PerceptualHashCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = PerceptualHashCache(maxsize=4, max_distance=2)
+        self.cache.store(0b1111_0000, True)
+
+    def test_exact_match(self):
+        self.assertIs(self.cache.lookup(0b1111_0000), True)
+
+    def test_near_duplicate_within_distance(self):
+        self.assertIs(self.cache.lookup(0b1111_0011), True) # 2 bits differ
+
+    def test_too_different_is_a_miss(self):
+        self.assertIsNone(self.cache.lookup(0b1111_0111)) # 3 bits differ
+
+    def test_near_match_counts_as_a_use(self):
+        cache = PerceptualHashCache(maxsize=2, max_distance=1)
+        cache.store(0b00, False)
+        cache.store(0b1100, True)
+        cache.lookup(0b01) # near match refreshes 0b00
+        cache.store(0b110000, True)
+        self.assertEqual(list(cache), [0b00, 0b110000])
+
+
+if __name__ == "__main__":
+    unittest.main()
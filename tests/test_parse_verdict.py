@@ -0,0 +1,24 @@
+import unittest
+
+from bot import parse_verdict
+
+
+class ParseVerdictTests(unittest.TestCase):
+    def test_reads_first_letter(self):
+        for answer, expected in (("YES", True), ("yes.", True), ("Y", True), ("NO", False), ("no", False), ("Nope", False)):
+            with self.subTest(answer=answer):
+                self.assertIs(parse_verdict(answer), expected)
+
+    def test_skips_whitespace_and_list_markers(self):
+        for answer, expected in (("  YES", True), ("1. NO", False), ("- yes", True), ("* No", False), ("10) YES", True)):
+            with self.subTest(answer=answer):
+                self.assertIs(parse_verdict(answer), expected)
+
+    def test_anything_else_is_unknown(self):
+        for answer in ("", "   ", "MAYBE", "I can't tell", "1."):
+            with self.subTest(answer=answer):
+                self.assertIsNone(parse_verdict(answer))
+
+
+if __name__ == "__main__":
+    unittest.main()
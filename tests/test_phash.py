@@ -0,0 +1,55 @@
+import io
+import unittest
+import warnings
+
+from PIL import Image, ImageDraw
+
+from phash import PHASH_MAX_PIXELS, compute_phash
+
+
+def encode(image, fmt="PNG"):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def sample_image(size=(256, 256), flip=False):
+    """A few shapes on a gradient, so the low frequencies have something to describe."""
+    image = Image.linear_gradient("L").resize(size).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    w, h = size
+    draw.ellipse((w // 8, h // 8, w // 2, h // 2), fill=(200, 120, 40))
+    draw.rectangle((w // 2, h // 2, w - w // 8, h - h // 8), fill=(20, 20, 160))
+    return image.transpose(Image.Transpose.FLIP_LEFT_RIGHT) if flip else image
+
+
+def distance(a, b):
+    return (a ^ b).bit_count()
+
+
+class ComputePhashTests(unittest.TestCase):
+    def test_hash_is_64_bits(self):
+        self.assertLess(compute_phash(encode(sample_image())), 1 << 64)
+
+    def test_reencoded_and_resized_copies_stay_close(self):
+        original = compute_phash(encode(sample_image()))
+        copy = compute_phash(encode(sample_image((512, 512)), "JPEG"))
+        self.assertLessEqual(distance(original, copy), 6)
+
+    def test_different_pictures_are_far_apart(self):
+        self.assertGreater(distance(compute_phash(encode(sample_image())), compute_phash(encode(sample_image(flip=True)))), 6)
+
+    def test_refuses_images_too_large_to_decode_cheaply(self):
+        # A 1-bit PNG like this is only ~20 KB on the wire but over 100 MB once converted
+        bomb = encode(Image.new("1", (13000, 13000)))
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            self.assertIsNone(compute_phash(bomb))
+
+    def test_large_jpegs_are_drafted_down_instead_of_refused(self):
+        side = int(PHASH_MAX_PIXELS ** 0.5) * 2
+        self.assertIsNotNone(compute_phash(encode(sample_image((side, side)), "JPEG")))
+
+
+if __name__ == "__main__":
+    unittest.main()
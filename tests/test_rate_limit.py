@@ -0,0 +1,108 @@
+import time
+import unittest
+from unittest import mock
+
+import orjson
+
+import bot
+from bot import OPENROUTER_MAX_ATTEMPTS, OPENROUTER_MAX_BACKOFF_SECONDS, TokenBucket, post_chat_completion, retry_delay
+
+
+class FakeResponse:
+    def __init__(self, status, body=b"", headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def read(self):
+        return self.body
+
+    async def text(self):
+        return self.body.decode()
+
+
+class FakeSession:
+    """Stands in for aiohttp.ClientSession, replying to each post() with the next queued response."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.posts = 0
+
+    def post(self, url, **kwargs):
+        self.posts += 1
+        return self.responses.pop(0)
+
+
+def completion(text):
+    return FakeResponse(200, orjson.dumps({"choices": [{"message": {"content": text}}]}))
+
+
+class RetryDelayTests(unittest.TestCase):
+    def test_honours_numeric_retry_after(self):
+        self.assertEqual(retry_delay(0, "2"), 2.0)
+
+    def test_caps_retry_after(self):
+        self.assertEqual(retry_delay(0, "3600"), OPENROUTER_MAX_BACKOFF_SECONDS)
+
+    def test_backs_off_exponentially_with_jitter(self):
+        for attempt in range(4):
+            with self.subTest(attempt=attempt):
+                base = 0.5 * 2 ** attempt
+                self.assertTrue(base <= retry_delay(attempt, None) < base + 1)
+
+    def test_http_date_retry_after_falls_back_to_backoff(self):
+        delay = retry_delay(1, "Wed, 21 Oct 2015 07:28:00 GMT")
+        self.assertTrue(1 <= delay < 2)
+
+    def test_backoff_is_capped(self):
+        self.assertEqual(retry_delay(20, None), OPENROUTER_MAX_BACKOFF_SECONDS)
+
+
+class TokenBucketTests(unittest.IsolatedAsyncioTestCase):
+    async def test_burst_is_immediate_then_rate_limited(self):
+        bucket = TokenBucket(rate=50, burst=3)
+        start = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        self.assertLess(time.monotonic() - start, 0.01)
+
+        await bucket.acquire() # the fourth has to wait for a refill (1/50 s)
+        self.assertGreaterEqual(time.monotonic() - start, 0.015)
+
+
+@mock.patch.object(bot, "openrouter_bucket", TokenBucket(rate=1000, burst=1000))
+@mock.patch("bot.asyncio.sleep", new_callable=mock.AsyncMock)
+class PostChatCompletionTests(unittest.IsolatedAsyncioTestCase):
+    async def test_returns_reply_text(self, sleep):
+        session = FakeSession(completion("YES"))
+        self.assertEqual(await post_chat_completion(session, {}), "YES")
+        sleep.assert_not_awaited()
+
+    async def test_retries_rate_limits_and_server_errors(self, sleep):
+        session = FakeSession(FakeResponse(429, headers={"Retry-After": "3"}), FakeResponse(503), completion("NO"))
+        with self.assertLogs("bot", "WARNING"):
+            self.assertEqual(await post_chat_completion(session, {}), "NO")
+        self.assertEqual(session.posts, 3)
+        self.assertEqual(sleep.await_args_list[0].args, (3.0,))
+
+    async def test_gives_up_after_max_attempts(self, sleep):
+        session = FakeSession(*(FakeResponse(429) for _ in range(OPENROUTER_MAX_ATTEMPTS)))
+        with self.assertLogs("bot", "WARNING"):
+            self.assertIsNone(await post_chat_completion(session, {}))
+        self.assertEqual(session.posts, OPENROUTER_MAX_ATTEMPTS)
+
+    async def test_does_not_retry_client_errors(self, sleep):
+        session = FakeSession(FakeResponse(400, b"bad request"), completion("YES"))
+        with self.assertLogs("bot", "ERROR"):
+            self.assertIsNone(await post_chat_completion(session, {}))
+        self.assertEqual(session.posts, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
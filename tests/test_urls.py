@@ -0,0 +1,125 @@
+import unittest
+from types import SimpleNamespace
+
+from bot import canonical_url, guess_media_type, is_fetchable_url, is_immutable_content, iter_image_candidates
+
+UNPARSEABLE_URLS = ("https://a℀b.com/x", "https://exa／mple.com")
+
+
+def make_message(content="", attachments=(), embeds=()):
+    return SimpleNamespace(content=content, attachments=list(attachments), embeds=list(embeds))
+
+
+class CanonicalUrlTests(unittest.TestCase):
+    def test_strips_discord_signing_params(self):
+        url = "https://cdn.discordapp.com/attachments/1/2/Cute.png?ex=65a&is=659&hm=abc&width=300"
+        self.assertEqual(canonical_url(url), "https://cdn.discordapp.com/attachments/1/2/Cute.png?width=300")
+
+    def test_refreshed_discord_links_share_a_key(self):
+        first = "https://media.discordapp.net/attachments/1/2/a.png?ex=1&is=2&hm=3"
+        second = "https://media.discordapp.net/attachments/1/2/a.png?ex=4&is=5&hm=6"
+        self.assertEqual(canonical_url(first), canonical_url(second))
+
+    def test_keeps_signing_param_names_on_other_hosts(self):
+        url = "https://example.com/image?ex=1&id=7"
+        self.assertEqual(canonical_url(url), url)
+
+    def test_lowercases_scheme_and_host_but_not_path(self):
+        self.assertEqual(canonical_url("HTTPS://I.Imgur.COM/AbC.png"), "https://i.imgur.com/AbC.png")
+        self.assertNotEqual(canonical_url("https://i.imgur.com/AbC.png"), canonical_url("https://i.imgur.com/abc.png"))
+
+    def test_drops_fragment(self):
+        self.assertEqual(canonical_url("https://example.com/a.png#top"), "https://example.com/a.png")
+
+    def test_unparseable_host_is_keyed_by_raw_text(self):
+        # urlsplit() raises ValueError for hosts that change under NFKC normalization
+        for url in UNPARSEABLE_URLS:
+            with self.subTest(url=url):
+                self.assertEqual(canonical_url(url), url)
+
+
+class GuessMediaTypeTests(unittest.TestCase):
+    def test_uses_path_extension(self):
+        self.assertEqual(guess_media_type("https://example.com/A.PNG?x=1"), "image")
+        self.assertEqual(guess_media_type("https://example.com/clip.webm"), "video")
+        self.assertIsNone(guess_media_type("https://example.com/page"))
+
+    def test_ignores_extension_in_query(self):
+        self.assertIsNone(guess_media_type("https://example.com/page?file=a.png"))
+
+    def test_unparseable_url_is_unknown(self):
+        for url in UNPARSEABLE_URLS:
+            with self.subTest(url=url):
+                self.assertIsNone(guess_media_type(url))
+
+
+class IsFetchableUrlTests(unittest.TestCase):
+    def test_allows_https_on_known_cdns(self):
+        for url in ("https://cdn.discordapp.com/a.png", "https://media.tenor.com/x.gif", "https://i.imgur.com/AbC.png"):
+            with self.subTest(url=url):
+                self.assertTrue(is_fetchable_url(url))
+
+    def test_rejects_everything_else(self):
+        for url in (
+            "http://cdn.discordapp.com/a.png", # not https
+            "https://localhost/a.png",
+            "https://127.0.0.1/a.png",
+            "https://evilimgur.com/a.png", # suffix without a dot boundary
+            "https://i.imgur.com@10.0.0.1/a.png", # userinfo, real host is 10.0.0.1
+            *UNPARSEABLE_URLS,
+        ):
+            with self.subTest(url=url):
+                self.assertFalse(is_fetchable_url(url))
+
+
+class IsImmutableContentTests(unittest.TestCase):
+    def test_attachments_and_discord_cdn_attachment_paths_are_immutable(self):
+        for key in (
+            "attachment:42",
+            canonical_url("https://cdn.discordapp.com/attachments/1/2/a.png?ex=1&is=2&hm=3"),
+            canonical_url("https://media.discordapp.net/attachments/1/2/a.png?width=300"),
+        ):
+            with self.subTest(key=key):
+                self.assertTrue(is_immutable_content(key))
+
+    def test_other_hosts_and_proxied_urls_are_mutable(self):
+        for key in (
+            "https://i.imgur.com/AbC.png",
+            "https://media.discordapp.net/external/abc/https/example.com/a.png", # proxies a remote file
+            "http://cdn.discordapp.com/attachments/1/2/a.png",
+            *UNPARSEABLE_URLS,
+        ):
+            with self.subTest(key=key):
+                self.assertFalse(is_immutable_content(key))
+
+
+class IterImageCandidatesTests(unittest.TestCase):
+    def test_collects_text_attachment_and_embed_candidates(self):
+        attachment = SimpleNamespace(id=42, url="https://cdn.discordapp.com/attachments/1/2/pic.png?ex=1", content_type="image/png")
+        embed = SimpleNamespace(
+            type="gifv", url="https://tenor.com/view/x",
+            thumbnail=SimpleNamespace(url="https://media.tenor.com/x.png"), image=SimpleNamespace(url=None),
+        )
+        message = make_message("look https://example.com/a.jpg.", [attachment], [embed])
+        self.assertEqual(list(iter_image_candidates(message)), [
+            ("https://example.com/a.jpg", "https://example.com/a.jpg", "image"),
+            (attachment.url, "attachment:42", "image"),
+            ("https://media.tenor.com/x.png", "https://media.tenor.com/x.png", "image"),
+        ])
+
+    def test_skips_duplicate_cache_keys(self):
+        message = make_message("https://cdn.discordapp.com/a.png?ex=1 https://cdn.discordapp.com/a.png?ex=2")
+        self.assertEqual(len(list(iter_image_candidates(message))), 1)
+
+    def test_unparseable_link_does_not_hide_later_candidates(self):
+        # Regression: the bad link used to raise out of the generator, so the attachment was never checked
+        attachment = SimpleNamespace(id=7, url="https://cdn.discordapp.com/attachments/1/2/hamster.png", content_type="image/png")
+        message = make_message("lol https://a℀b.com/x", [attachment])
+        self.assertEqual(list(iter_image_candidates(message)), [
+            ("https://a℀b.com/x", "https://a℀b.com/x", None),
+            (attachment.url, "attachment:7", "image"),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from bot import VerdictStore
+
+
+class VerdictStoreTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "verdicts.db")
+        self.store = await self.open_store()
+
+    async def asyncTearDown(self):
+        await self.store.close()
+
+    async def open_store(self):
+        store = VerdictStore(self.path)
+        await store.open()
+        return store
+
+    async def test_unknown_key_is_none(self):
+        self.assertIsNone(await self.store.lookup("attachment:1"))
+
+    async def test_buffered_verdicts_are_visible_before_flush(self):
+        self.store.store("attachment:1", False)
+        self.assertIs(await self.store.lookup("attachment:1"), False)
+
+    async def test_flushed_verdicts_survive_a_restart(self):
+        self.store.store("attachment:1", True)
+        self.store.store("attachment:2", False)
+        await self.store.close()
+
+        self.store = await self.open_store()
+        self.assertIs(await self.store.lookup("attachment:1"), True)
+        self.assertIs(await self.store.lookup("attachment:2"), False)
+
+    async def test_recent_with_prefix_is_newest_first_and_limited(self):
+        for ts, key in enumerate(("phash:01", "attachment:1", "phash:02", "phash:03"), start=1000):
+            self.store.store(key, ts % 2 == 0)
+            with mock.patch("bot.time.time", return_value=ts):
+                await self.store.flush()
+        self.assertEqual(await self.store.recent_with_prefix("phash:", 2), [("phash:03", False), ("phash:02", True)])
+
+    async def test_expire_drops_only_old_verdicts(self):
+        self.store.store("attachment:old", True)
+        with mock.patch("bot.time.time", return_value=1_000):
+            await self.store.flush()
+        self.store.store("attachment:new", True)
+        with mock.patch("bot.time.time", return_value=2_000):
+            await self.store.flush()
+
+        with mock.patch("bot.time.time", return_value=2_500), self.assertLogs("bot", "INFO"):
+            await self.store.expire(max_age=1_000)
+        self.assertIsNone(await self.store.lookup("attachment:old"))
+        self.assertIs(await self.store.lookup("attachment:new"), True)
+
+    async def test_lookups_after_close_miss_instead_of_raising(self):
+        await self.store.close()
+        self.assertIsNone(await self.store.lookup("attachment:1"))
+        await self.store.close() # closing twice is harmless
+
+
+if __name__ == "__main__":
+    unittest.main()